@@ -1,15 +1,47 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from email.message import EmailMessage
 import os
 import datetime
 import google.generativeai as genai
 import time
+import asyncio
+import re
+import json
+import functools
+from urllib.parse import urlparse
+from google.api_core import exceptions as google_exceptions
+import aiohttp
+import trafilatura
+import summary_cache
 
 # --- CONFIGURATION ---
 SOURCE_URL = "https://alphaideas.in/"
+POST_TITLE_SELECTOR = 'h2.entry-title a, h3.entry-title a'
+HOMEPAGE_PEEK_BYTES = 64 * 1024
+HOMEPAGE_CACHE = os.path.join(summary_cache.CACHE_DIR, 'homepage.json')
+# Strainers match the class attribute as a whole string, so match the class token explicitly
+ENTRY_CONTENT_ONLY = SoupStrainer('div', class_=re.compile(r'(^|\s)entry-content(\s|$)'))
+PARAGRAPHS_ONLY = SoupStrainer('p')
+CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+MAX_CONCURRENT_FETCHES = 8
+MAX_ARTICLE_TOKENS = 4000
+CHARS_PER_TOKEN = 4
+# Markers may come back wrapped in markdown, e.g. "**<<<ID 1>>>**:" or "### <<<ID 1>>>"
+BATCH_MARKER_RE = re.compile(r"[#*\s]*<<<ID (\d+)>>>[*:\s]*")
+# Internal/social hosts (and their subdomains) that are never summarized
+BLOCKED_HOSTS_RE = re.compile(
+    r"(?:^|\.)(?:alphaideas\.in|facebook\.com|twitter\.com|x\.com|t\.co|linkedin\.com|instagram\.com)$"
+)
+PRIMARY_MODEL = 'gemini-1.5-flash'
+SECONDARY_MODEL = 'gemini-1.5-pro'
+MAX_RETRIES = 2
+GEMINI_RPS = 1 # Per-article fallback only; the batched call is a single request
+SUMMARY_UNAVAILABLE = "Summary unavailable (All AI models failed to respond)."
+RETRYABLE_ERRORS = (google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable)
 EMAIL_USER = os.environ.get('EMAIL_USER')
 EMAIL_PASS = os.environ.get('EMAIL_PASS')
 EMAIL_RECEIVER = os.environ.get('EMAIL_RECEIVER')
@@ -18,21 +50,36 @@ GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
 # Configure AI
 genai.configure(api_key=GEMINI_API_KEY)
 
+# Shared HTTP session (keep-alive + connection pooling across all fetches)
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Accept-Encoding': 'gzip, deflate, br', # br is decoded via the brotli package
+}
+SESSION = requests.Session()
+SESSION.headers.update(HTTP_HEADERS)
+_adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20,
+                       max_retries=Retry(total=2, backoff_factor=0.3))
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
+
 # --- ROBUST AI FUNCTIONS ---
 
-def get_working_summary(full_text):
-    """
-    Tries multiple models in order of preference until one works.
-    """
-    # 1. List of preferred models to try (Fastest -> Strongest -> Legacy)
-    priority_models = [
-        'gemini-1.5-flash',
-        'gemini-1.5-pro',
-        'gemini-pro',
-        'gemini-1.0-pro'
-    ]
+class RateLimiter:
+    """Spaces calls at least 1/rps seconds apart, sleeping only for the time still owed."""
 
-    prompt = f"""
+    def __init__(self, rps):
+        self.interval = 1.0 / rps
+        self.next_allowed_at = 0.0
+
+    def acquire(self):
+        now = time.monotonic()
+        if self.next_allowed_at > now:
+            time.sleep(self.next_allowed_at - now)
+            now = self.next_allowed_at
+        self.next_allowed_at = now + self.interval
+
+def build_prompt(full_text):
+    return f"""
     Read the following news article text and provide a 2-sentence executive summary.
     Focus on the key facts and numbers.
     
@@ -40,46 +87,222 @@ def get_working_summary(full_text):
     {full_text}
     """
 
-    # 2. Try the priority list
-    for model_name in priority_models:
+@functools.lru_cache(maxsize=None)
+def list_generation_models():
+    """Names of models that support generateContent (fetched once per process)."""
+    return tuple(m.name for m in genai.list_models()
+                 if 'generateContent' in m.supported_generation_methods)
+
+def generate_with_retry(model_name, prompt, retries=MAX_RETRIES):
+    """
+    Calls one model, retrying only transient errors (429 / 503) with a growing backoff.
+    Any other error (e.g. model not found) is raised immediately.
+    """
+    model = genai.GenerativeModel(model_name)
+    for attempt in range(retries + 1):
+        try:
+            return model.generate_content(prompt).text.strip()
+        except RETRYABLE_ERRORS as e:
+            if attempt == retries:
+                raise
+            print(f"Model {model_name} busy ({e.__class__.__name__}), retrying...")
+            time.sleep(1.0 * (attempt + 1))
+
+def generate_with_fallback(prompt):
+    """
+    Tries the primary model (with retries), then a single secondary model,
+    then whatever the API reports as available.
+    Returns (response_text, model_name), or (None, None) if every model failed.
+    """
+    # 1. Primary, then secondary model
+    for model_name in (PRIMARY_MODEL, SECONDARY_MODEL):
         try:
-            # print(f"Trying model: {model_name}...") # Uncomment for debugging
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(prompt)
-            return response.text.strip()
+            return generate_with_retry(model_name, prompt), model_name
         except Exception as e:
-            # print(f"Model {model_name} failed: {e}")
-            continue # Try the next one in the list
+            print(f"Model {model_name} failed: {e}")
 
-    # 3. If all specific names fail, ask the API what is available
+    # 2. If both fail, ask the API what is available
     try:
         print("Standard models failed. Checking available API models...")
-        for m in genai.list_models():
-            if 'generateContent' in m.supported_generation_methods:
-                try:
-                    model = genai.GenerativeModel(m.name)
-                    response = model.generate_content(prompt)
-                    return response.text.strip()
-                except:
-                    continue
+        for model_name in list_generation_models():
+            # The API lists models as 'models/<name>'; skip the two that just failed
+            if model_name.split('/')[-1] in (PRIMARY_MODEL, SECONDARY_MODEL):
+                continue
+            try:
+                return generate_with_retry(model_name, prompt, retries=0), model_name
+            except Exception:
+                continue
     except Exception as e:
         print(f"Dynamic model search failed: {e}")
 
-    return "Summary unavailable (All AI models failed to respond)."
+    return None, None
+
+def get_working_summary(full_text):
+    """
+    Summarizes a single article.
+    Summaries are cached on disk by article text, so repeat articles skip the API.
+    """
+    cached = summary_cache.get(full_text)
+    if cached:
+        return cached
+
+    summary, model_name = generate_with_fallback(build_prompt(full_text))
+    if not summary:
+        return SUMMARY_UNAVAILABLE
+
+    summary_cache.put(full_text, summary, model_name)
+    return summary
+
+def get_batch_summaries(texts):
+    """
+    Summarizes several articles with ONE API call instead of one call each.
+    Each article is tagged with a <<<ID n>>> marker and the reply is split on the same markers.
+    Returns the summaries in input order, or None if the reply can't be split cleanly.
+    If no model responded at all, every slot is SUMMARY_UNAVAILABLE (retrying per article would just fail again).
+    """
+    articles_block = "\n\n".join(f"<<<ID {i}>>>\n{text}" for i, text in enumerate(texts, 1))
+    prompt = f"""
+    Below are {len(texts)} news articles, each starting with a marker like <<<ID 1>>>.
+    For each article, provide a 2-sentence executive summary.
+    Focus on the key facts and numbers.
+    Reply with exactly one summary per article, each preceded by its marker (e.g. <<<ID 1>>>), and nothing else.
+    
+    {articles_block}
+    """
+
+    response, model_name = generate_with_fallback(prompt)
+    if not response:
+        return [SUMMARY_UNAVAILABLE] * len(texts)
+
+    # re.split with a capture group gives ['', '1', 'summary 1', '2', 'summary 2', ...]
+    parts = BATCH_MARKER_RE.split(response)[1:]
+    by_id = {int(parts[i]): parts[i + 1].strip().strip('*:').strip() for i in range(0, len(parts) - 1, 2)}
+    summaries = [by_id.get(i) for i in range(1, len(texts) + 1)]
+    if not all(summaries):
+        return None
+
+    for text, summary in zip(texts, summaries):
+        summary_cache.put(text, summary, model_name)
+    return summaries
+
+def summarize_articles(texts):
+    """
+    Returns one summary per article text, in order.
+    Cache misses are summarized together in a single batched call; if the batch
+    reply can't be split per article, falls back to one call per article.
+    """
+    summaries = [None] * len(texts)
+    pending = []
+    for i, full_text in enumerate(texts):
+        if len(full_text) < 200:
+            summaries[i] = "Could not extract text (Site might block bots or be empty)."
+        else:
+            summaries[i] = summary_cache.get(full_text)
+            if not summaries[i]:
+                pending.append(i)
+
+    if len(pending) > 1:
+        batch = get_batch_summaries([texts[i] for i in pending])
+        if batch:
+            for i, summary in zip(pending, batch):
+                summaries[i] = summary
+            return summaries
+        print("Batch summary failed. Falling back to one call per article...")
+
+    limiter = RateLimiter(rps=GEMINI_RPS)
+    for i in pending:
+        limiter.acquire() # Polite delay, only when the previous call returned quickly
+        summaries[i] = get_working_summary(texts[i])
+    return summaries
 
 
 # --- WEBSCRAPING FUNCTIONS ---
 
+def _decode_html(body, content_type):
+    """
+    Decodes a response body using the charset declared in Content-Type, else as UTF-8
+    if it is valid UTF-8. Skips the charset autodetection that response.text falls back to.
+    Otherwise returns the raw bytes, so BeautifulSoup/trafilatura can honour a <meta charset>.
+    """
+    match = CHARSET_RE.search(content_type or "")
+    if match:
+        try:
+            return body.decode(match.group(1), errors='replace')
+        except LookupError: # Unknown charset name
+            pass
+
+    try:
+        return body.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multibyte character cut off at the end of a partial read is still UTF-8
+        if e.start >= len(body) - 3 and e.reason == 'unexpected end of data':
+            return body.decode('utf-8', errors='replace')
+        return body
+
+def _find_linkfest_link(soup, scan_all=True):
+    """Returns the href of the first 'Linkfest' post link in a parsed homepage, or None."""
+    # Fast path: only look at post-title anchors
+    for link in soup.select(POST_TITLE_SELECTOR):
+        href = link.get('href')
+        if href and "Linkfest" in link.get_text(strip=True):
+            return href
+    if not scan_all:
+        return None
+
+    # Fallback: scan every anchor (in case the theme markup changes)
+    for link in soup.find_all('a'):
+        text = link.get_text()
+        if "Linkfest" in text and "Continue reading" not in text:
+            return link['href']
+    return None
+
+def _load_homepage_cache():
+    """Validators (ETag / Last-Modified) and Linkfest URL from the previous run, if any."""
+    try:
+        with open(HOMEPAGE_CACHE, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_homepage_cache(headers, linkfest_url):
+    try:
+        os.makedirs(os.path.dirname(HOMEPAGE_CACHE), exist_ok=True)
+        with open(HOMEPAGE_CACHE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'linkfest_url': linkfest_url,
+            }, f)
+    except OSError as e:
+        print(f"Could not write homepage cache: {e}")
+
 def get_latest_linkfest_url():
     """Finds the latest 'Linkfest' post from the homepage."""
+    cached = _load_homepage_cache()
+    conditional_headers = {}
+    if cached.get('linkfest_url'):
+        if cached.get('etag'):
+            conditional_headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            conditional_headers['If-Modified-Since'] = cached['last_modified']
+
     try:
-        response = requests.get(SOURCE_URL)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        for link in soup.find_all('a'):
-            text = link.get_text()
-            if "Linkfest" in text and "Continue reading" not in text:
-                return link['href']
+        with SESSION.get(SOURCE_URL, headers=conditional_headers, stream=True, timeout=10) as response:
+            if response.status_code == 304:
+                print("Homepage not modified since last run.")
+                return cached['linkfest_url']
+
+            # The latest posts are at the top, so usually the first chunk is enough
+            content_type = response.headers.get('Content-Type')
+            body = response.raw.read(HOMEPAGE_PEEK_BYTES, decode_content=True)
+            link = _find_linkfest_link(BeautifulSoup(_decode_html(body, content_type), 'lxml'), scan_all=False)
+            if not link:
+                body += response.raw.read(decode_content=True)
+                link = _find_linkfest_link(BeautifulSoup(_decode_html(body, content_type), 'lxml'))
+
+        if link:
+            _save_homepage_cache(response.headers, link)
+        return link
     except Exception as e:
         print(f"Error finding Linkfest: {e}")
     return None
@@ -87,52 +310,81 @@ def get_latest_linkfest_url():
 def extract_article_links(post_url):
     """Extracts external news links from the specific Linkfest post."""
     links_to_summarize = []
+    seen = set()
     try:
-        response = requests.get(post_url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        response = SESSION.get(post_url, timeout=10)
+        html = _decode_html(response.content, response.headers.get('Content-Type'))
+        # Only build a tree for the post body, not comments/sidebars/related posts
+        soup = BeautifulSoup(html, 'lxml', parse_only=ENTRY_CONTENT_ONLY)
         
         content_div = soup.find('div', class_='entry-content')
         
         if content_div:
             for p in content_div.find_all('p'):
-                a_tag = p.find('a')
-                if a_tag and a_tag['href']:
-                    href = a_tag['href']
-                    # Filter out internal/social links
-                    if "alphaideas.in" not in href and "facebook.com" not in href and "twitter.com" not in href:
-                        links_to_summarize.append({
-                            'title': p.get_text().strip(),
-                            'url': href
-                        })
+                a_tag = p.find('a', href=True)
+                if not a_tag or not a_tag['href']:
+                    continue
+                href = a_tag['href']
+                try:
+                    hostname = urlparse(href).hostname or ""
+                except ValueError: # Malformed URL, e.g. "http://[bad"
+                    continue
+                # Filter out internal/social links
+                if BLOCKED_HOSTS_RE.search(hostname):
+                    continue
+                # Skip repeats of the same article (ignoring #fragment and trailing slash)
+                normalized = href.split('#')[0].rstrip('/')
+                if normalized in seen:
+                    continue
+                seen.add(normalized)
+                links_to_summarize.append({
+                    'title': p.get_text().strip(),
+                    'url': href
+                })
     except Exception as e:
         print(f"Error extracting links: {e}")
     return links_to_summarize
 
-def fetch_article_text(url):
-    """Fetches text from a URL."""
+def _parse_article(html):
+    """
+    Extracts the main article text from HTML (CPU-bound, runs off the event loop).
+    trafilatura strips navigation/ads/footers; plain <p> text is the fallback.
+    """
+    text = trafilatura.extract(html, include_comments=False, include_tables=False)
+    if not text:
+        soup = BeautifulSoup(html, 'lxml', parse_only=PARAGRAPHS_ONLY)
+        text = " ".join(p.get_text() for p in soup.find_all('p'))
+    return text[:MAX_ARTICLE_TOKENS * CHARS_PER_TOKEN] # Limit prompt size (~4 chars per token)
+
+async def fetch_article_text_async(session, sem, url):
+    """Fetches text from a URL without blocking the event loop."""
     try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        paragraphs = [p.get_text() for p in soup.find_all('p')]
-        text = " ".join(paragraphs)[:10000] # Limit size
-        return text
-    except:
+        async with sem, session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            body = await response.read()
+            html = _decode_html(body, response.headers.get('Content-Type'))
+        return await asyncio.to_thread(_parse_article, html)
+    except Exception:
         return ""
 
+async def gather_all(urls):
+    """Fetches all article texts concurrently, at most MAX_CONCURRENT_FETCHES at a time."""
+    sem = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+    connector = aiohttp.TCPConnector(limit=20)
+    async with aiohttp.ClientSession(connector=connector, headers=HTTP_HEADERS) as session:
+        return await asyncio.gather(*[fetch_article_text_async(session, sem, url) for url in urls])
+
 def send_email(summary_html):
-    msg = MIMEMultipart()
+    msg = EmailMessage()
     msg['From'] = EMAIL_USER
     msg['To'] = EMAIL_RECEIVER
     msg['Subject'] = f"Alpha Ideas Daily Brief - {datetime.date.today()}"
-    msg.attach(MIMEText(summary_html, 'html'))
+    msg.set_content(summary_html, subtype='html')
 
     try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASS)
-        server.sendmail(EMAIL_USER, EMAIL_RECEIVER, msg.as_string())
-        server.quit()
+        # Implicit TLS on 465 saves the STARTTLS round trip of port 587
+        with smtplib.SMTP_SSL('smtp.gmail.com', 465, timeout=30) as server:
+            server.login(EMAIL_USER, EMAIL_PASS)
+            server.send_message(msg)
         print("Email sent successfully!")
     except Exception as e:
         print(f"Failed to send email: {e}")
@@ -140,6 +392,7 @@ def send_email(summary_html):
 # --- MAIN EXECUTION ---
 if __name__ == "__main__":
     print("Starting Daily Brief...")
+    summary_cache.sweep()
     
     linkfest_url = get_latest_linkfest_url()
     if not linkfest_url:
@@ -150,26 +403,30 @@ if __name__ == "__main__":
     articles = extract_article_links(linkfest_url)
     print(f"Found {len(articles)} articles.")
     
-    email_content = f"<h2>Daily Brief: {datetime.date.today()}</h2>"
-    email_content += f"<p>Source: <a href='{linkfest_url}'>Alpha Ideas Linkfest</a></p><hr>"
+    parts = [
+        f"<h2>Daily Brief: {datetime.date.today()}</h2>",
+        f"<p>Source: <a href='{linkfest_url}'>Alpha Ideas Linkfest</a></p><hr>",
+    ]
     
     # Process up to 10 articles
-    for article in articles[:10]:
+    articles = articles[:10]
+    for article in articles:
         print(f"Processing: {article['title']}")
-        
-        # 1. Get Text
-        full_text = fetch_article_text(article['url'])
-        
-        if len(full_text) < 200:
-            summary = "Could not extract text (Site might block bots or be empty)."
-        else:
-            # 2. Get Summary (Using Robust Fail-Proof Logic)
-            summary = get_working_summary(full_text)
-        
-        email_content += f"<h3>{article['title']}</h3>"
-        email_content += f"<p><i>Summary:</i> {summary}</p>"
-        email_content += f"<p><a href='{article['url']}'>Read Original Article</a></p><br>"
-        
-        time.sleep(1) # Polite delay
+    
+    # 1. Get Text (all fetches concurrently on one event loop)
+    texts = asyncio.run(gather_all([a['url'] for a in articles]))
+    
+    # 2. Get Summaries (one batched call, Using Robust Fail-Proof Logic)
+    # The batch needs every text, so there is no per-article fetch/summarize overlap to exploit here;
+    # the fetch stage above is already concurrent and bounded by the slowest article.
+    summaries = summarize_articles(texts)
+    
+    for article, summary in zip(articles, summaries):
+        parts.extend([
+            f"<h3>{article['title']}</h3>",
+            f"<p><i>Summary:</i> {summary}</p>",
+            f"<p><a href='{article['url']}'>Read Original Article</a></p><br>",
+        ])
 
+    email_content = "".join(parts)
     send_email(email_content)
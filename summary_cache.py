@@ -0,0 +1,79 @@
+import glob
+import hashlib
+import json
+import os
+import time
+
+# --- CONFIGURATION ---
+CACHE_DIR = "cache"
+PROMPT_VERSION = "v1"  # Bump whenever the summary prompt changes
+TTL_SECONDS = 7 * 86400
+
+
+def _key(text):
+    """Content address of an article: SHA-256 over prompt version + text."""
+    return hashlib.sha256(f"{PROMPT_VERSION}|".encode() + text.encode()).hexdigest()
+
+def _path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def get(text):
+    """Returns the cached summary for this article text, or None on a miss/expiry."""
+    path = _path(_key(text))
+    try:
+        with open(path, encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if entry.get('expires_at', 0) < time.time():
+        _remove(path)
+        return None
+    return entry.get('summary')
+
+def put(text, summary, model=None):
+    """Stores a summary for this article text. Cache write failures are not fatal."""
+    path = _path(_key(text))
+    now = time.time()
+    entry = {
+        'model': model,
+        'prompt_version': PROMPT_VERSION,
+        'summary': summary,
+        'created_at': now,
+        'expires_at': now + TTL_SECONDS,
+    }
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)  # Atomic, so a crash never leaves a half-written entry
+    except OSError as e:
+        print(f"Could not write summary cache: {e}")
+
+def sweep():
+    """
+    Deletes expired entries and entries written under an older PROMPT_VERSION.
+    Old-version entries live at different paths and are never read again, so
+    without this the persisted cache directory would grow forever.
+    Returns the number of entries removed.
+    """
+    now = time.time()
+    removed = 0
+    for path in glob.glob(os.path.join(CACHE_DIR, '*', '*.json')):
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            dead = entry.get('prompt_version') != PROMPT_VERSION or entry.get('expires_at', 0) < now
+        except (OSError, ValueError):
+            dead = True # Unreadable/corrupt entry
+        if dead:
+            _remove(path)
+            removed += 1
+    return removed